@@ -1,5 +1,7 @@
 import re
-from typing import Dict, Any, Optional, Tuple
+from functools import partial
+from cachetools import LRUCache
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
 from sqlalchemy.orm import Session
 
 from models import Conversation, Message, Vehicle, ConversationState
@@ -8,6 +10,69 @@ from services.nhtsa import NHTSAService
 from services.zenquotes import ZenQuotesService
 
 
+# State values as plain strings, bound once instead of resolved per comparison
+S_ZIP_CODE = ConversationState.ZIP_CODE.value
+S_FULL_NAME = ConversationState.FULL_NAME.value
+S_EMAIL = ConversationState.EMAIL.value
+S_VEHICLE_CHOICE = ConversationState.VEHICLE_CHOICE.value
+S_VEHICLE_VIN = ConversationState.VEHICLE_VIN.value
+S_VEHICLE_YEAR = ConversationState.VEHICLE_YEAR.value
+S_VEHICLE_MAKE = ConversationState.VEHICLE_MAKE.value
+S_VEHICLE_BODY = ConversationState.VEHICLE_BODY.value
+S_VEHICLE_USE = ConversationState.VEHICLE_USE.value
+S_BLIND_SPOT_WARNING = ConversationState.BLIND_SPOT_WARNING.value
+S_COMMUTE_DAYS = ConversationState.COMMUTE_DAYS.value
+S_COMMUTE_MILES = ConversationState.COMMUTE_MILES.value
+S_ANNUAL_MILEAGE = ConversationState.ANNUAL_MILEAGE.value
+S_ADD_ANOTHER_VEHICLE = ConversationState.ADD_ANOTHER_VEHICLE.value
+S_LICENSE_TYPE = ConversationState.LICENSE_TYPE.value
+S_LICENSE_STATUS = ConversationState.LICENSE_STATUS.value
+S_COMPLETE = ConversationState.COMPLETE.value
+
+# Validation patterns, compiled once at import. re.ASCII keeps \d and \b on
+# the ASCII tables; every value we accept here is plain ASCII anyway.
+VIN_RE = re.compile(r'\b([A-HJ-NPR-Z0-9]{17})\b', re.ASCII)
+ZIP_RE = re.compile(r'\b(\d{5})\b', re.ASCII)
+EMAIL_RE = re.compile(r'[a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,}', re.ASCII | re.IGNORECASE)
+YEAR_RE = re.compile(r'\b(19\d{2}|20\d{2})\b', re.ASCII)
+DIGIT_RE = re.compile(r'\b(\d+)\b', re.ASCII)
+DAYS_RE = re.compile(r'\b([1-7])\b', re.ASCII)
+BODY_RE = re.compile(r'\b(sedan|suv|truck|coupe|hatchback|van|wagon|convertible|minivan|pickup)s?\b', re.ASCII)
+
+# Keyword alternations (plain substring matches, searched against lowercased input)
+MANUAL_ENTRY_RE = re.compile(r"year|make|manual|type|other")
+YES_RE = re.compile(r"yes|yeah|yep|have|equipped|does")
+NO_RE = re.compile(r"no|nope|not|don't|doesn't")
+ADD_MORE_RE = re.compile(r"yes|yeah|yep|another|add|more")
+DONE_RE = re.compile(r"no|nope|done|that's all|that's it")
+LICENSE_COMMERCIAL_RE = re.compile(r"commercial|cdl")
+LICENSE_VALID_RE = re.compile(r"valid|active|good")
+
+# Whole-message replies that are just data; see process_message
+LOOKS_LIKE_DATA_RE = re.compile(
+    r"(?:[\d ,./-]+|[A-HJ-NPR-Z0-9]{17}|[^\s@]+@[^\s@]+|yes|yeah|yep|no|nope|y|n)\Z",
+    re.ASCII | re.IGNORECASE,
+)
+
+# History window step: short conversations send every message; once there
+# are at least HISTORY_WINDOW, the window advances in steps of HISTORY_WINDOW
+# and 10-19 past messages are sent (see _get_conversation_history)
+HISTORY_WINDOW = 10
+
+# (is_valid, extracted_value, error_message)
+ValidationResult = Tuple[bool, Any, Optional[str]]
+
+
+def _extract_vin(user_input: str) -> Optional[str]:
+    """Pull a VIN out of the input, checking first for the usual bare-VIN reply."""
+    upper = user_input.upper()
+    if NHTSAService.is_valid_vin_format(upper):
+        return upper
+    # Fall back to the regex for VINs embedded in a sentence
+    vin_match = VIN_RE.search(upper)
+    return vin_match.group(1) if vin_match else None
+
+
 class ConversationEngine:
     """Manages the conversation flow and state transitions."""
     
@@ -15,6 +80,8 @@ class ConversationEngine:
         self.openai_service = OpenAIService()
         self.nhtsa_service = NHTSAService()
         self.zenquotes_service = ZenQuotesService()
+        # conversation id -> (messages covered, summary) for history older than the window
+        self._history_summaries: LRUCache = LRUCache(maxsize=1024)
     
     def _get_context(self, conversation: Conversation) -> Dict[str, Any]:
         """Get current context from conversation."""
@@ -34,168 +101,242 @@ class ConversationEngine:
             return conversation.vehicles[-1]
         return None
     
+    async def _get_conversation_history(
+        self,
+        conversation: Conversation,
+        db: Session
+    ) -> Tuple[List[Dict[str, str]], Optional[Callable[[], Awaitable[Optional[str]]]]]:
+        """
+        Get the recent messages to send as history, plus a loader for the summary
+        of older ones that have dropped out of the window (None if nothing has
+        yet). The loader is handed to generate_response, which only awaits it
+        when the reply actually comes from the model.
+        
+        The window starts on a multiple of HISTORY_WINDOW and grows to just under
+        twice that before jumping forward, so consecutive turns send the same
+        leading messages and OpenAI's prompt cache can reuse them. A plain
+        "last N" slice would shift the first message every turn.
+        """
+        query = db.query(Message).filter(Message.conversation_id == conversation.id)
+        total = query.count()
+        window_start = max(0, (total - HISTORY_WINDOW) // HISTORY_WINDOW * HISTORY_WINDOW)
+        
+        # Let SQL do the windowing instead of loading conversation.messages
+        messages = query.order_by(Message.id).offset(window_start).all()
+        history = [{"role": m.role, "content": m.content} for m in messages]
+        
+        load_summary = None
+        if window_start:
+            load_summary = partial(self._get_history_summary, conversation, query, window_start)
+        
+        return history, load_summary
+    
+    async def _get_history_summary(self, conversation: Conversation, query, upto: int) -> Optional[str]:
+        """
+        Return a summary of the conversation's first `upto` messages.
+        
+        Summaries are kept per conversation and extended incrementally: only
+        messages that left the window since the last summary are sent to the
+        model, together with the previous summary. The window only moves every
+        HISTORY_WINDOW messages, so this runs on a small fraction of turns.
+        """
+        covered, summary = self._history_summaries.get(conversation.id, (0, None))
+        if covered >= upto:
+            return summary
+        
+        older = query.order_by(Message.id).offset(covered).limit(upto - covered).all()
+        new_summary = await self.openai_service.summarize_history(
+            summary, [{"role": m.role, "content": m.content} for m in older]
+        )
+        if new_summary is None:
+            # Summarizing failed; keep what we had and retry next turn
+            return summary
+        
+        self._history_summaries[conversation.id] = (upto, new_summary)
+        return new_summary
+    
+    def _apply_vin_data(self, vehicle: Vehicle, vin_data: Dict[str, Any]):
+        """Copy decoded NHTSA VIN data onto a vehicle."""
+        vehicle.vin = vin_data.get('vin')
+        vehicle.year = int(vin_data.get('year')) if vin_data.get('year') else None
+        vehicle.make = vin_data.get('make')
+        vehicle.body_type = vin_data.get('body_class')
+    
+    async def _validate_zip_code(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        # Extract 5-digit zip code
+        match = ZIP_RE.search(user_input)
+        if match:
+            return True, match.group(1), None
+        return False, None, "Please provide a valid 5-digit ZIP code."
+    
+    async def _validate_full_name(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        # Accept any non-empty string with at least 2 characters
+        if len(user_input) >= 2:
+            return True, user_input, None
+        return False, None, "Please provide your full name."
+    
+    async def _validate_email(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        # Basic email validation
+        match = EMAIL_RE.search(user_input)
+        if match:
+            return True, match.group(0).lower(), None
+        return False, None, "Please provide a valid email address."
+    
+    async def _validate_vehicle_choice(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        # Check if user provided a VIN directly (17 alphanumeric characters)
+        vin = _extract_vin(user_input)
+        if vin:
+            # User provided VIN directly, validate it immediately
+            result = await self.nhtsa_service.decode_vin(vin)
+            if result.get('valid'):
+                result['vin'] = vin
+                return True, {'choice': 'vin', 'vin_data': result}, None
+            return False, None, result.get('error', 'Invalid VIN.')
+        elif 'vin' in lower:
+            return True, 'vin', None
+        elif MANUAL_ENTRY_RE.search(lower):
+            return True, 'manual', None
+        return False, None, None  # Will re-ask
+    
+    async def _validate_vehicle_vin(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        # VIN is 17 characters
+        vin = _extract_vin(user_input)
+        if vin:
+            # Validate with NHTSA
+            result = await self.nhtsa_service.decode_vin(vin)
+            if result.get('valid'):
+                result['vin'] = vin  # Include the VIN in the result
+                return True, result, None
+            return False, None, result.get('error', 'Invalid VIN.')
+        return False, None, "Please provide a valid 17-character VIN."
+    
+    async def _validate_vehicle_year(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        match = YEAR_RE.search(user_input)
+        if match:
+            year = int(match.group(1))
+            if 1900 <= year <= 2026:
+                return True, year, None
+        return False, None, "Please provide a valid vehicle year (e.g., 2020)."
+    
+    async def _validate_vehicle_make(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        if len(user_input) >= 2:
+            # Validate with NHTSA
+            vehicle = self._get_current_vehicle(conversation)
+            year = vehicle.year if vehicle else 2020
+            result = await self.nhtsa_service.validate_year_make(year, user_input)
+            if result.get('valid'):
+                return True, user_input.title(), None
+            return False, None, result.get('error', 'Invalid make.')
+        return False, None, "Please provide the vehicle make."
+    
+    async def _validate_vehicle_body(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        body_match = BODY_RE.search(lower)
+        if body_match:
+            return True, body_match.group(1).title(), None
+        # Accept any reasonable input
+        if len(user_input) >= 2:
+            return True, user_input.title(), None
+        return False, None, "Please provide the body type (e.g., Sedan, SUV, Truck)."
+    
+    async def _validate_vehicle_use(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        if 'commut' in lower:
+            return True, 'commuting', None
+        elif 'commercial' in lower:
+            return True, 'commercial', None
+        elif 'farm' in lower:
+            return True, 'farming', None
+        elif 'business' in lower:
+            return True, 'business', None
+        return False, None, "Please specify: Commuting, Commercial, Farming, or Business."
+    
+    async def _validate_blind_spot_warning(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        if YES_RE.search(lower):
+            return True, True, None
+        elif NO_RE.search(lower):
+            return True, False, None
+        return False, None, "Please answer Yes or No."
+    
+    async def _validate_commute_days(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        match = DAYS_RE.search(user_input)
+        if match:
+            return True, int(match.group(1)), None
+        return False, None, "Please provide days per week (1-7)."
+    
+    async def _validate_commute_miles(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        match = DIGIT_RE.search(user_input)
+        if match:
+            miles = int(match.group(1))
+            if miles > 0:
+                return True, miles, None
+        return False, None, "Please provide the one-way distance in miles."
+    
+    async def _validate_annual_mileage(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        match = DIGIT_RE.search(user_input.replace(',', ''))
+        if match:
+            mileage = int(match.group(1))
+            if mileage > 0:
+                return True, mileage, None
+        return False, None, "Please provide estimated annual mileage."
+    
+    async def _validate_add_another_vehicle(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        if ADD_MORE_RE.search(lower):
+            return True, True, None
+        elif DONE_RE.search(lower):
+            return True, False, None
+        return False, None, "Would you like to add another vehicle? (Yes/No)"
+    
+    async def _validate_license_type(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        if 'foreign' in lower:
+            return True, 'foreign', None
+        elif 'personal' in lower:
+            return True, 'personal', None
+        elif LICENSE_COMMERCIAL_RE.search(lower):
+            return True, 'commercial', None
+        return False, None, "Please specify: Foreign, Personal, or Commercial."
+    
+    async def _validate_license_status(self, user_input: str, lower: str, conversation: Conversation) -> ValidationResult:
+        if LICENSE_VALID_RE.search(lower):
+            return True, 'valid', None
+        elif 'suspend' in lower:
+            return True, 'suspended', None
+        return False, None, "Please specify: Valid or Suspended."
+    
+    # State -> validator, looked up once per message instead of an if/elif ladder
+    _VALIDATORS: Dict[str, Callable[..., Awaitable[ValidationResult]]] = {
+        S_ZIP_CODE: _validate_zip_code,
+        S_FULL_NAME: _validate_full_name,
+        S_EMAIL: _validate_email,
+        S_VEHICLE_CHOICE: _validate_vehicle_choice,
+        S_VEHICLE_VIN: _validate_vehicle_vin,
+        S_VEHICLE_YEAR: _validate_vehicle_year,
+        S_VEHICLE_MAKE: _validate_vehicle_make,
+        S_VEHICLE_BODY: _validate_vehicle_body,
+        S_VEHICLE_USE: _validate_vehicle_use,
+        S_BLIND_SPOT_WARNING: _validate_blind_spot_warning,
+        S_COMMUTE_DAYS: _validate_commute_days,
+        S_COMMUTE_MILES: _validate_commute_miles,
+        S_ANNUAL_MILEAGE: _validate_annual_mileage,
+        S_ADD_ANOTHER_VEHICLE: _validate_add_another_vehicle,
+        S_LICENSE_TYPE: _validate_license_type,
+        S_LICENSE_STATUS: _validate_license_status,
+    }
+    
     async def _validate_and_extract(
         self, 
         state: str, 
         user_input: str,
         conversation: Conversation
-    ) -> Tuple[bool, Any, Optional[str]]:
+    ) -> ValidationResult:
         """
         Validate user input for current state.
         Returns: (is_valid, extracted_value, error_message)
         """
         user_input = user_input.strip()
         
-        if state == ConversationState.ZIP_CODE.value:
-            # Extract 5-digit zip code
-            match = re.search(r'\b(\d{5})\b', user_input)
-            if match:
-                return True, match.group(1), None
-            return False, None, "Please provide a valid 5-digit ZIP code."
-        
-        elif state == ConversationState.FULL_NAME.value:
-            # Accept any non-empty string with at least 2 characters
-            if len(user_input) >= 2:
-                return True, user_input, None
-            return False, None, "Please provide your full name."
-        
-        elif state == ConversationState.EMAIL.value:
-            # Basic email validation
-            email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-            match = re.search(email_pattern, user_input)
-            if match:
-                return True, match.group(0).lower(), None
-            return False, None, "Please provide a valid email address."
-        
-        elif state == ConversationState.VEHICLE_CHOICE.value:
-            lower = user_input.lower()
-            # Check if user provided a VIN directly (17 alphanumeric characters)
-            vin_match = re.search(r'\b([A-HJ-NPR-Z0-9]{17})\b', user_input.upper())
-            if vin_match:
-                # User provided VIN directly, validate it immediately
-                vin = vin_match.group(1)
-                result = await self.nhtsa_service.decode_vin(vin)
-                if result.get('valid'):
-                    result['vin'] = vin
-                    return True, {'choice': 'vin', 'vin_data': result}, None
-                return False, None, result.get('error', 'Invalid VIN.')
-            elif 'vin' in lower:
-                return True, 'vin', None
-            elif any(word in lower for word in ['year', 'make', 'manual', 'type', 'other']):
-                return True, 'manual', None
-            return False, None, None  # Will re-ask
-        
-        elif state == ConversationState.VEHICLE_VIN.value:
-            # VIN is 17 characters
-            vin_match = re.search(r'\b([A-HJ-NPR-Z0-9]{17})\b', user_input.upper())
-            if vin_match:
-                vin = vin_match.group(1)
-                # Validate with NHTSA
-                result = await self.nhtsa_service.decode_vin(vin)
-                if result.get('valid'):
-                    result['vin'] = vin  # Include the VIN in the result
-                    return True, result, None
-                return False, None, result.get('error', 'Invalid VIN.')
-            return False, None, "Please provide a valid 17-character VIN."
-        
-        elif state == ConversationState.VEHICLE_YEAR.value:
-            match = re.search(r'\b(19\d{2}|20\d{2})\b', user_input)
-            if match:
-                year = int(match.group(1))
-                if 1900 <= year <= 2026:
-                    return True, year, None
-            return False, None, "Please provide a valid vehicle year (e.g., 2020)."
-        
-        elif state == ConversationState.VEHICLE_MAKE.value:
-            if len(user_input) >= 2:
-                # Validate with NHTSA
-                vehicle = self._get_current_vehicle(conversation)
-                year = vehicle.year if vehicle else 2020
-                result = await self.nhtsa_service.validate_year_make(year, user_input)
-                if result.get('valid'):
-                    return True, user_input.title(), None
-                return False, None, result.get('error', 'Invalid make.')
-            return False, None, "Please provide the vehicle make."
-        
-        elif state == ConversationState.VEHICLE_BODY.value:
-            valid_bodies = ['sedan', 'suv', 'truck', 'coupe', 'hatchback', 'van', 
-                          'wagon', 'convertible', 'minivan', 'pickup']
-            lower = user_input.lower()
-            for body in valid_bodies:
-                if body in lower:
-                    return True, body.title(), None
-            # Accept any reasonable input
-            if len(user_input) >= 2:
-                return True, user_input.title(), None
-            return False, None, "Please provide the body type (e.g., Sedan, SUV, Truck)."
-        
-        elif state == ConversationState.VEHICLE_USE.value:
-            lower = user_input.lower()
-            if 'commut' in lower:
-                return True, 'commuting', None
-            elif 'commercial' in lower:
-                return True, 'commercial', None
-            elif 'farm' in lower:
-                return True, 'farming', None
-            elif 'business' in lower:
-                return True, 'business', None
-            return False, None, "Please specify: Commuting, Commercial, Farming, or Business."
-        
-        elif state == ConversationState.BLIND_SPOT_WARNING.value:
-            lower = user_input.lower()
-            if any(word in lower for word in ['yes', 'yeah', 'yep', 'have', 'equipped', 'does']):
-                return True, True, None
-            elif any(word in lower for word in ['no', 'nope', 'not', "don't", "doesn't"]):
-                return True, False, None
-            return False, None, "Please answer Yes or No."
-        
-        elif state == ConversationState.COMMUTE_DAYS.value:
-            match = re.search(r'\b([1-7])\b', user_input)
-            if match:
-                return True, int(match.group(1)), None
-            return False, None, "Please provide days per week (1-7)."
-        
-        elif state == ConversationState.COMMUTE_MILES.value:
-            match = re.search(r'\b(\d+)\b', user_input)
-            if match:
-                miles = int(match.group(1))
-                if miles > 0:
-                    return True, miles, None
-            return False, None, "Please provide the one-way distance in miles."
-        
-        elif state == ConversationState.ANNUAL_MILEAGE.value:
-            match = re.search(r'\b(\d+)\b', user_input.replace(',', ''))
-            if match:
-                mileage = int(match.group(1))
-                if mileage > 0:
-                    return True, mileage, None
-            return False, None, "Please provide estimated annual mileage."
-        
-        elif state == ConversationState.ADD_ANOTHER_VEHICLE.value:
-            lower = user_input.lower()
-            if any(word in lower for word in ['yes', 'yeah', 'yep', 'another', 'add', 'more']):
-                return True, True, None
-            elif any(word in lower for word in ['no', 'nope', 'done', "that's all", "that's it"]):
-                return True, False, None
-            return False, None, "Would you like to add another vehicle? (Yes/No)"
-        
-        elif state == ConversationState.LICENSE_TYPE.value:
-            lower = user_input.lower()
-            if 'foreign' in lower:
-                return True, 'foreign', None
-            elif 'personal' in lower:
-                return True, 'personal', None
-            elif 'commercial' in lower or 'cdl' in lower:
-                return True, 'commercial', None
-            return False, None, "Please specify: Foreign, Personal, or Commercial."
-        
-        elif state == ConversationState.LICENSE_STATUS.value:
-            lower = user_input.lower()
-            if 'valid' in lower or 'active' in lower or 'good' in lower:
-                return True, 'valid', None
-            elif 'suspend' in lower:
-                return True, 'suspended', None
-            return False, None, "Please specify: Valid or Suspended."
+        handler = self._VALIDATORS.get(state)
+        if handler:
+            # Case-fold once here rather than in each handler
+            return await handler(self, user_input, user_input.lower(), conversation)
         
         return True, user_input, None
     
@@ -208,71 +349,91 @@ class ConversationEngine:
         """Determine the next state based on current state and value."""
         
         state_transitions = {
-            ConversationState.ZIP_CODE.value: ConversationState.FULL_NAME.value,
-            ConversationState.FULL_NAME.value: ConversationState.EMAIL.value,
-            ConversationState.EMAIL.value: ConversationState.VEHICLE_CHOICE.value,
+            S_ZIP_CODE: S_FULL_NAME,
+            S_FULL_NAME: S_EMAIL,
+            S_EMAIL: S_VEHICLE_CHOICE,
         }
         
-        if current_state == ConversationState.VEHICLE_CHOICE.value:
+        if current_state == S_VEHICLE_CHOICE:
             # If user provided VIN data directly, skip to VEHICLE_USE
             if isinstance(value, dict) and 'vin_data' in value:
-                return ConversationState.VEHICLE_USE.value
+                return S_VEHICLE_USE
             # If user said they want to provide VIN, go to VIN state
             elif value == 'vin':
-                return ConversationState.VEHICLE_VIN.value
+                return S_VEHICLE_VIN
             # Otherwise, go to manual entry (year)
-            return ConversationState.VEHICLE_YEAR.value
+            return S_VEHICLE_YEAR
         
-        if current_state == ConversationState.VEHICLE_VIN.value:
-            return ConversationState.VEHICLE_USE.value
+        if current_state == S_VEHICLE_VIN:
+            return S_VEHICLE_USE
         
-        if current_state == ConversationState.VEHICLE_YEAR.value:
-            return ConversationState.VEHICLE_MAKE.value
+        if current_state == S_VEHICLE_YEAR:
+            return S_VEHICLE_MAKE
         
-        if current_state == ConversationState.VEHICLE_MAKE.value:
-            return ConversationState.VEHICLE_BODY.value
+        if current_state == S_VEHICLE_MAKE:
+            return S_VEHICLE_BODY
         
-        if current_state == ConversationState.VEHICLE_BODY.value:
-            return ConversationState.VEHICLE_USE.value
+        if current_state == S_VEHICLE_BODY:
+            return S_VEHICLE_USE
         
-        if current_state == ConversationState.VEHICLE_USE.value:
-            return ConversationState.BLIND_SPOT_WARNING.value
+        if current_state == S_VEHICLE_USE:
+            return S_BLIND_SPOT_WARNING
         
-        if current_state == ConversationState.BLIND_SPOT_WARNING.value:
+        if current_state == S_BLIND_SPOT_WARNING:
             vehicle = self._get_current_vehicle(conversation)
             if vehicle and vehicle.vehicle_use == 'commuting':
-                return ConversationState.COMMUTE_DAYS.value
-            return ConversationState.ANNUAL_MILEAGE.value
+                return S_COMMUTE_DAYS
+            return S_ANNUAL_MILEAGE
         
-        if current_state == ConversationState.COMMUTE_DAYS.value:
-            return ConversationState.COMMUTE_MILES.value
+        if current_state == S_COMMUTE_DAYS:
+            return S_COMMUTE_MILES
         
-        if current_state == ConversationState.COMMUTE_MILES.value:
+        if current_state == S_COMMUTE_MILES:
             # After commute vehicle is done, ask if they want to add another
-            return ConversationState.ADD_ANOTHER_VEHICLE.value
+            return S_ADD_ANOTHER_VEHICLE
         
-        if current_state == ConversationState.ANNUAL_MILEAGE.value:
+        if current_state == S_ANNUAL_MILEAGE:
             # After commercial/farming/business vehicle is done, ask if they want to add another
-            return ConversationState.ADD_ANOTHER_VEHICLE.value
+            return S_ADD_ANOTHER_VEHICLE
         
-        if current_state == ConversationState.ADD_ANOTHER_VEHICLE.value:
+        if current_state == S_ADD_ANOTHER_VEHICLE:
             if value:  # User wants to add another vehicle
-                return ConversationState.VEHICLE_CHOICE.value
+                return S_VEHICLE_CHOICE
             # User is done adding vehicles, now collect license info
-            return ConversationState.LICENSE_TYPE.value
+            return S_LICENSE_TYPE
         
-        if current_state == ConversationState.LICENSE_TYPE.value:
+        if current_state == S_LICENSE_TYPE:
             if value == 'foreign':
                 # Foreign license, skip status and complete
-                return ConversationState.COMPLETE.value
-            return ConversationState.LICENSE_STATUS.value
+                return S_COMPLETE
+            return S_LICENSE_STATUS
         
-        if current_state == ConversationState.LICENSE_STATUS.value:
+        if current_state == S_LICENSE_STATUS:
             # All done!
-            return ConversationState.COMPLETE.value
+            return S_COMPLETE
         
         return state_transitions.get(current_state, current_state)
     
+    # States whose value maps straight onto a single column
+    _CONVERSATION_FIELD_MAP: Dict[str, str] = {
+        S_ZIP_CODE: 'zip_code',
+        S_FULL_NAME: 'full_name',
+        S_EMAIL: 'email',
+        S_LICENSE_TYPE: 'license_type',
+        S_LICENSE_STATUS: 'license_status',
+    }
+    
+    _VEHICLE_FIELD_MAP: Dict[str, str] = {
+        S_VEHICLE_YEAR: 'year',
+        S_VEHICLE_MAKE: 'make',
+        S_VEHICLE_BODY: 'body_type',
+        S_VEHICLE_USE: 'vehicle_use',
+        S_BLIND_SPOT_WARNING: 'blind_spot_warning',
+        S_COMMUTE_DAYS: 'days_per_week',
+        S_COMMUTE_MILES: 'one_way_miles',
+        S_ANNUAL_MILEAGE: 'annual_mileage',
+    }
+    
     async def _save_value(
         self,
         state: str,
@@ -280,87 +441,33 @@ class ConversationEngine:
         conversation: Conversation,
         db: Session
     ):
-        """Save the extracted value to the appropriate field."""
+        """Save the extracted value to the appropriate field. The caller commits."""
         
-        if state == ConversationState.ZIP_CODE.value:
-            conversation.zip_code = value
+        attr = self._CONVERSATION_FIELD_MAP.get(state)
+        if attr:
+            setattr(conversation, attr, value)
         
-        elif state == ConversationState.FULL_NAME.value:
-            conversation.full_name = value
-        
-        elif state == ConversationState.EMAIL.value:
-            conversation.email = value
+        elif state in self._VEHICLE_FIELD_MAP:
+            vehicle = self._get_current_vehicle(conversation)
+            if vehicle:
+                setattr(vehicle, self._VEHICLE_FIELD_MAP[state], value)
         
-        elif state == ConversationState.VEHICLE_CHOICE.value:
-            # Create a new vehicle entry
-            vehicle = Vehicle(conversation_id=conversation.id)
-            db.add(vehicle)
-            db.commit()
+        elif state == S_VEHICLE_CHOICE:
+            # Create a new vehicle entry, filled in before it is attached so the
+            # caller's single commit inserts the complete row. Appending through
+            # the relationship keeps the loaded conversation.vehicles current.
+            vehicle = Vehicle()
             
             # If user provided VIN directly, save the VIN data
             if isinstance(value, dict) and 'vin_data' in value:
-                vin_data = value['vin_data']
-                vehicle.vin = vin_data.get('vin')
-                vehicle.year = int(vin_data.get('year')) if vin_data.get('year') else None
-                vehicle.make = vin_data.get('make')
-                vehicle.body_type = vin_data.get('body_class')
-                db.commit()
-        
-        elif state == ConversationState.VEHICLE_VIN.value:
-            vehicle = self._get_current_vehicle(conversation)
-            if vehicle and isinstance(value, dict):
-                vehicle.vin = value.get('vin')
-                vehicle.year = int(value.get('year')) if value.get('year') else None
-                vehicle.make = value.get('make')
-                vehicle.body_type = value.get('body_class')
-        
-        elif state == ConversationState.VEHICLE_YEAR.value:
-            vehicle = self._get_current_vehicle(conversation)
-            if vehicle:
-                vehicle.year = value
-        
-        elif state == ConversationState.VEHICLE_MAKE.value:
-            vehicle = self._get_current_vehicle(conversation)
-            if vehicle:
-                vehicle.make = value
-        
-        elif state == ConversationState.VEHICLE_BODY.value:
-            vehicle = self._get_current_vehicle(conversation)
-            if vehicle:
-                vehicle.body_type = value
-        
-        elif state == ConversationState.VEHICLE_USE.value:
-            vehicle = self._get_current_vehicle(conversation)
-            if vehicle:
-                vehicle.vehicle_use = value
-        
-        elif state == ConversationState.BLIND_SPOT_WARNING.value:
-            vehicle = self._get_current_vehicle(conversation)
-            if vehicle:
-                vehicle.blind_spot_warning = value
-        
-        elif state == ConversationState.COMMUTE_DAYS.value:
-            vehicle = self._get_current_vehicle(conversation)
-            if vehicle:
-                vehicle.days_per_week = value
-        
-        elif state == ConversationState.COMMUTE_MILES.value:
-            vehicle = self._get_current_vehicle(conversation)
-            if vehicle:
-                vehicle.one_way_miles = value
+                self._apply_vin_data(vehicle, value['vin_data'])
+            
+            conversation.vehicles.append(vehicle)
         
-        elif state == ConversationState.ANNUAL_MILEAGE.value:
+        elif state == S_VEHICLE_VIN:
             vehicle = self._get_current_vehicle(conversation)
-            if vehicle:
-                vehicle.annual_mileage = value
-        
-        elif state == ConversationState.LICENSE_TYPE.value:
-            conversation.license_type = value
-        
-        elif state == ConversationState.LICENSE_STATUS.value:
-            conversation.license_status = value
-        
-        db.commit()
+            if vehicle and isinstance(value, dict):
+                self._apply_vin_data(vehicle, value)
     
     async def process_message(
         self,
@@ -370,34 +477,36 @@ class ConversationEngine:
     ) -> str:
         """Process a user message and return the bot's response."""
         
-        # Save user message
+        # Save user message (committed together with the state change below)
         user_msg = Message(
             conversation_id=conversation.id,
             role="user",
             content=user_message
         )
         db.add(user_msg)
-        db.commit()
         
-        # Check for frustration
-        is_frustrated = await self.openai_service.check_frustration(user_message)
+        current_state = conversation.current_state
+        
+        # Check for frustration. Plain data replies (numbers, a VIN, an email,
+        # yes/no) can't be expressing frustration, so skip the check for them.
+        is_frustrated = (
+            not LOOKS_LIKE_DATA_RE.match(user_message.strip())
+            and self.openai_service.check_frustration(user_message)
+        )
         
         if is_frustrated:
             quote = await self.zenquotes_service.get_quote()
             response = f"I understand this can be frustrating. Here's something to brighten your day:\n\n{quote}\n\nI'm here to help. Let's continue when you're ready."
         else:
-            current_state = conversation.current_state
-            
-            # Validate and extract value
+            # Validate and extract value (skipped when frustrated, saving NHTSA calls)
             is_valid, value, error_msg = await self._validate_and_extract(
                 current_state, user_message, conversation
             )
             
             context = self._get_context(conversation)
-            conversation_history = [
-                {"role": m.role, "content": m.content}
-                for m in conversation.messages[-10:]
-            ]
+            conversation_history, load_history_summary = await self._get_conversation_history(
+                conversation, db
+            )
             
             additional_context = None
             
@@ -408,19 +517,24 @@ class ConversationEngine:
                 # Move to next state
                 next_state = self._get_next_state(current_state, value, conversation)
                 conversation.current_state = next_state
-                db.commit()
                 
-                # Refresh context after saving
-                context = self._get_context(conversation)
-            else:
-                if error_msg:
-                    additional_context = f"The user's input was invalid. Error: {error_msg}"
+                # Update context with just what the save could have changed
+                field = self._CONVERSATION_FIELD_MAP.get(current_state)
+                if field:
+                    context[field] = value
+                context["vehicles_count"] = len(conversation.vehicles)
+            elif error_msg:
+                additional_context = f"The user's input was invalid. Error: {error_msg}"
+            
+            # Make the user message and state change durable before the slow OpenAI call
+            db.commit()
             
             # Generate response using OpenAI
             response = await self.openai_service.generate_response(
                 current_state=conversation.current_state,
                 user_message=user_message,
                 conversation_history=conversation_history,
+                load_history_summary=load_history_summary,
                 context=context,
                 additional_context=additional_context
             )
@@ -7,7 +7,9 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./chatbot.db"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: the engine commits mid-request and keeps using the
+# same objects, so don't force a reload of every attribute after each commit
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base = declarative_base()
 
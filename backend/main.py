@@ -1,4 +1,5 @@
 import uuid
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
@@ -7,14 +8,26 @@ from database import engine, get_db, Base
 from models import Conversation, Message
 from schemas import ChatRequest, ChatResponse, ConversationResponse
 from conversation_engine import ConversationEngine
+from services.nhtsa import NHTSAService
+from services.openai_service import OpenAIService
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close shared HTTP clients on shutdown
+    await NHTSAService.aclose()
+    await OpenAIService.aclose()
+
+
 app = FastAPI(
     title="Insurance Onboarding Chatbot",
     description="Conversational chatbot for insurance onboarding",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -124,5 +137,7 @@ async def list_conversations(db: Session = Depends(get_db)):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # uvicorn[standard] ships uvloop and loop="auto" picks it up wherever it's
+    # installed (not on Windows), falling back to the stock asyncio loop
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, loop="auto")
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -62,11 +62,15 @@ class Conversation(Base):
     
     # Relationships
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
-    vehicles = relationship("Vehicle", back_populates="conversation", cascade="all, delete-orphan")
+    vehicles = relationship("Vehicle", back_populates="conversation", cascade="all, delete-orphan", lazy="selectin")
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Recent-history lookups filter by conversation and order by id
+        Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"))
@@ -1,5 +1,8 @@
+import time
 import httpx
-from typing import Optional, Dict, Any
+import orjson
+from cachetools import TTLCache
+from typing import Optional, Dict, Any, FrozenSet
 
 
 class NHTSAService:
@@ -7,6 +10,49 @@ class NHTSAService:
     
     BASE_URL = "https://vpic.nhtsa.dot.gov/api/vehicles"
     
+    # Characters allowed in a VIN (ISO 3779 excludes I, O and Q)
+    _VIN_CHARS = frozenset("ABCDEFGHJKLMNPRSTUVWXYZ0123456789")
+    
+    # DecodeVinValues fields used by _parse_vin_response
+    _VIN_FIELDS = ("ErrorCode", "ErrorText", "Make", "Model", "ModelYear", "BodyClass")
+    
+    # Shared across requests so lookups reuse pooled keep-alive connections
+    # instead of paying a fresh TCP + TLS handshake on every call
+    _client = httpx.AsyncClient(
+        base_url=BASE_URL,
+        timeout=10.0,
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    )
+    
+    # Decoded VINs, keyed by VIN. NHTSA answers for a VIN don't change.
+    _vin_cache: TTLCache = TTLCache(maxsize=2048, ttl=24 * 3600)
+    
+    # Mass-market makes accepted without consulting NHTSA at all
+    _COMMON_MAKES = frozenset({
+        "FORD", "TOYOTA", "HONDA", "CHEVROLET", "NISSAN", "JEEP", "GMC", "DODGE",
+        "RAM", "SUBARU", "HYUNDAI", "KIA", "MAZDA", "VOLKSWAGEN", "BMW",
+        "MERCEDES-BENZ", "AUDI", "LEXUS", "ACURA", "INFINITI", "TESLA", "VOLVO",
+        "PORSCHE", "CHRYSLER", "BUICK", "CADILLAC", "LINCOLN", "MITSUBISHI",
+        "GENESIS", "MINI", "FIAT", "JAGUAR", "LAND ROVER", "MASERATI", "BENTLEY",
+        "ROLLS-ROYCE", "FERRARI", "LAMBORGHINI", "ALFA ROMEO",
+    })
+    
+    # Known makes (car + all makes lists), loaded once and refreshed daily
+    MAKES_TTL = 24 * 3600
+    _makes: Optional[FrozenSet[str]] = None
+    _makes_loaded_at: float = 0.0
+    
+    @staticmethod
+    async def aclose() -> None:
+        """Close the shared HTTP client. Called on application shutdown."""
+        await NHTSAService._client.aclose()
+    
+    @staticmethod
+    def is_valid_vin_format(vin: str) -> bool:
+        """Cheap structural check: 17 characters, all from the VIN alphabet."""
+        return len(vin) == 17 and NHTSAService._VIN_CHARS.issuperset(vin.upper())
+    
     @staticmethod
     async def decode_vin(vin: str) -> Dict[str, Any]:
         """
@@ -18,134 +64,160 @@ class NHTSAService:
         1-6 = Warnings but VIN structure is valid
         7+ = Invalid VIN format
         
+        VINs that fail the local structural check are rejected without calling NHTSA.
         Note: We don't validate checksums locally because not all manufacturers
         follow the standard strictly, and NHTSA accepts VINs without valid checksums.
         """
+        if not NHTSAService.is_valid_vin_format(vin):
+            return {
+                "valid": False,
+                "error": "Invalid VIN: a VIN is 17 letters and digits and never contains I, O or Q."
+            }
+        
+        cached = NHTSAService._vin_cache.get(vin)
+        if cached is not None:
+            return dict(cached)
+        
         # Use DecodeVinValues for better validation
-        url = f"{NHTSAService.BASE_URL}/DecodeVinValues/{vin}?format=json"
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, timeout=10.0)
-                response.raise_for_status()
-                data = response.json()
-                
-                results = data.get("Results", [])
-                
-                if not results:
-                    return {
-                        "valid": False,
-                        "error": "Could not decode VIN. Please verify it's correct."
-                    }
-                
-                # Extract data from results
-                result_data = results[0] if results else {}
-                
-                # Get error code and convert to int safely
-                error_code_raw = result_data.get("ErrorCode", "0")
-                try:
-                    error_code = int(str(error_code_raw).strip()) if error_code_raw else 0
-                except (ValueError, TypeError):
-                    error_code = 0
-                
-                # Extract vehicle information
-                make = result_data.get("Make")
-                model = result_data.get("Model")
-                year = result_data.get("ModelYear")
-                body_class = result_data.get("BodyClass")
-                
-                # Error codes 0-6 are acceptable (0 = perfect, 1-6 = warnings but valid)
-                # Error codes 7+ indicate invalid VIN structure
-                if error_code >= 7:
-                    error_text = result_data.get("ErrorText", "Invalid VIN format")
-                    return {
-                        "valid": False,
-                        "error": f"Invalid VIN: {error_text}"
-                    }
-                
-                # Must have at least a make to be considered valid
-                if not make or make.strip() == "":
-                    return {
-                        "valid": False,
-                        "error": "Could not decode VIN. Please verify it's correct."
-                    }
-                
-                # Additional validation: reject if make seems like a manufacturer code (contains +)
-                # or if it's obviously not a consumer vehicle
-                suspicious_makes = ["SHERMAN + REILLY", "INCOMPLETE", "NOT APPLICABLE"]
-                if make.upper() in suspicious_makes or "+" in make:
-                    # For non-consumer vehicles, require at least a year to accept
-                    if not year or year.strip() == "":
-                        return {
-                            "valid": False,
-                            "error": "This VIN doesn't appear to be for a standard consumer vehicle."
-                        }
-                
-                # Stricter validation: For consumer vehicles, we should have at least make and year
-                # If NHTSA gives us incomplete data on what should be a normal car, it's suspicious
-                if error_code >= 1 and (not year or not model):
-                    # Warn user but don't block - could be an older vehicle
-                    pass
-                
-                return {
-                    "valid": True,
-                    "make": make,
-                    "model": model,
-                    "year": year,
-                    "body_class": body_class,
-                    "error_code": error_code  # Include for debugging
-                }
-                
-            except httpx.TimeoutException:
-                return {
-                    "valid": False,
-                    "error": "Vehicle verification service timed out. Please try again."
-                }
-            except Exception as e:
+        try:
+            response = await NHTSAService._client.get(f"/DecodeVinValues/{vin}?format=json")
+            response.raise_for_status()
+            result = NHTSAService._parse_vin_response(orjson.loads(response.content))
+        except httpx.TimeoutException:
+            return {
+                "valid": False,
+                "error": "Vehicle verification service timed out. Please try again."
+            }
+        except Exception as e:
+            return {
+                "valid": False,
+                "error": f"Error verifying vehicle: {str(e)}"
+            }
+        
+        # A decoded VIN (accepted or rejected) never changes, so cache it.
+        # Timeouts and transport errors return above and are retried next time.
+        NHTSAService._vin_cache[vin] = result
+        return dict(result)
+    
+    @staticmethod
+    def _parse_vin_response(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn a DecodeVinValues payload into our valid/error result dict."""
+        results = data.get("Results", [])
+        
+        if not results:
+            return {
+                "valid": False,
+                "error": "Could not decode VIN. Please verify it's correct."
+            }
+        
+        # Keep only the handful of fields we read out of the ~130 NHTSA returns
+        row = results[0]
+        result_data = {k: row[k] for k in NHTSAService._VIN_FIELDS if k in row}
+        
+        # Get error code and convert to int safely
+        error_code_raw = result_data.get("ErrorCode", "0")
+        try:
+            error_code = int(str(error_code_raw).strip()) if error_code_raw else 0
+        except (ValueError, TypeError):
+            error_code = 0
+        
+        # Extract vehicle information
+        make = result_data.get("Make")
+        model = result_data.get("Model")
+        year = result_data.get("ModelYear")
+        body_class = result_data.get("BodyClass")
+        
+        # Error codes 0-6 are acceptable (0 = perfect, 1-6 = warnings but valid)
+        # Error codes 7+ indicate invalid VIN structure
+        if error_code >= 7:
+            error_text = result_data.get("ErrorText", "Invalid VIN format")
+            return {
+                "valid": False,
+                "error": f"Invalid VIN: {error_text}"
+            }
+        
+        # Must have at least a make to be considered valid
+        if not make or make.strip() == "":
+            return {
+                "valid": False,
+                "error": "Could not decode VIN. Please verify it's correct."
+            }
+        
+        # Additional validation: reject if make seems like a manufacturer code (contains +)
+        # or if it's obviously not a consumer vehicle
+        suspicious_makes = ["SHERMAN + REILLY", "INCOMPLETE", "NOT APPLICABLE"]
+        if make.upper() in suspicious_makes or "+" in make:
+            # For non-consumer vehicles, require at least a year to accept
+            if not year or year.strip() == "":
                 return {
                     "valid": False,
-                    "error": f"Error verifying vehicle: {str(e)}"
+                    "error": "This VIN doesn't appear to be for a standard consumer vehicle."
                 }
-    
+        
+        # Stricter validation: For consumer vehicles, we should have at least make and year
+        # If NHTSA gives us incomplete data on what should be a normal car, it's suspicious
+        if error_code >= 1 and (not year or not model):
+            # Warn user but don't block - could be an older vehicle
+            pass
+        
+        return {
+            "valid": True,
+            "make": make,
+            "model": model,
+            "year": year,
+            "body_class": body_class,
+            "error_code": error_code  # Include for debugging
+        }
+
     @staticmethod
     async def validate_year_make(year: int, make: str) -> Dict[str, Any]:
         """
-        Validate that a make exists for a given year using NHTSA API.
+        Validate that a make exists using NHTSA's make lists.
+        The lists are fetched once and kept in memory as a set.
         """
-        url = f"{NHTSAService.BASE_URL}/GetMakesForVehicleType/car?format=json"
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, timeout=10.0)
-                response.raise_for_status()
-                data = response.json()
-                
-                results = data.get("Results", [])
-                makes = [r.get("MakeName", "").upper() for r in results]
-                
-                if make.upper() in makes:
-                    return {"valid": True}
-                
-                # Also check against all makes
-                all_makes_url = f"{NHTSAService.BASE_URL}/GetAllMakes?format=json"
-                response = await client.get(all_makes_url, timeout=10.0)
-                response.raise_for_status()
-                data = response.json()
-                
-                results = data.get("Results", [])
-                all_makes = [r.get("Make_Name", "").upper() for r in results]
-                
-                if make.upper() in all_makes:
-                    return {"valid": True}
-                
-                return {
-                    "valid": False,
-                    "error": f"'{make}' doesn't appear to be a valid vehicle make. Please check the spelling."
-                }
-                
-            except httpx.TimeoutException:
-                # On timeout, assume valid to not block user
-                return {"valid": True, "warning": "Could not verify make, proceeding anyway."}
-            except Exception:
-                return {"valid": True, "warning": "Could not verify make, proceeding anyway."}
-
+        if make.upper() in NHTSAService._COMMON_MAKES:
+            return {"valid": True}
+        
+        try:
+            makes = await NHTSAService._ensure_makes_loaded()
+        except Exception:
+            # If NHTSA is unreachable, assume valid to not block user
+            return {"valid": True, "warning": "Could not verify make, proceeding anyway."}
+        
+        if make.upper() in makes:
+            return {"valid": True}
+        
+        return {
+            "valid": False,
+            "error": f"'{make}' doesn't appear to be a valid vehicle make. Please check the spelling."
+        }
+    
+    @staticmethod
+    async def _ensure_makes_loaded() -> FrozenSet[str]:
+        """
+        Return the upper-cased set of known makes, fetching it from NHTSA on
+        first use and again once it is older than MAKES_TTL. If a refresh
+        fails, the previously loaded set keeps being used.
+        """
+        if (
+            NHTSAService._makes is not None
+            and time.monotonic() - NHTSAService._makes_loaded_at < NHTSAService.MAKES_TTL
+        ):
+            return NHTSAService._makes
+        
+        try:
+            response = await NHTSAService._client.get("/GetMakesForVehicleType/car?format=json")
+            response.raise_for_status()
+            car_makes = [r.get("MakeName", "") for r in orjson.loads(response.content).get("Results", [])]
+            
+            response = await NHTSAService._client.get("/GetAllMakes?format=json")
+            response.raise_for_status()
+            all_makes = [r.get("Make_Name", "") for r in orjson.loads(response.content).get("Results", [])]
+        except Exception:
+            if NHTSAService._makes is None:
+                raise
+            return NHTSAService._makes
+        
+        NHTSAService._makes = frozenset(m.upper() for m in car_makes + all_makes if m)
+        NHTSAService._makes_loaded_at = time.monotonic()
+        return NHTSAService._makes
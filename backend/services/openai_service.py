@@ -1,22 +1,24 @@
+import asyncio
+import hashlib
 import os
-from openai import AsyncOpenAI
-from typing import List, Dict, Optional
+import re
+import httpx
+import orjson
+from cachetools import LRUCache
+from functools import lru_cache
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Dict, Optional, Sequence, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Read once at import and fail fast at startup instead of on the first request
+_API_KEY = os.environ.get("OPENAI_API_KEY")
+if not _API_KEY:
+    raise RuntimeError("OPENAI_API_KEY not found. Add it to backend/.env (see README).")
 
-class OpenAIService:
-    """Service for generating conversational responses using OpenAI."""
-    
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.model = "gpt-4o-mini"
-    
-    def _get_system_prompt(self, current_state: str, context: Dict) -> str:
-        """Generate system prompt based on current conversation state."""
-        
-        base_prompt = """You are a friendly, professional insurance onboarding assistant. Your role is to collect information from users in a conversational way. Be concise but warm.
+
+BASE_PROMPT = """You are a friendly, professional insurance onboarding assistant. Your role is to collect information from users in a conversational way. Be concise but warm.
 
 CRITICAL RULES:
 1. You MUST ONLY ask the question specified in your current task - nothing else
@@ -30,104 +32,354 @@ CRITICAL RULES:
 9. NEVER say things like "That's all the information I need" or "We're all set" or "Do you have any other vehicles" unless the current task explicitly says to ask that
 10. If your task says to ask about LICENSE, do NOT ask about vehicles - ask about LICENSE
 """
+
+_BASE_SYSTEM_MESSAGE = {"role": "system", "content": BASE_PROMPT}
+
+STATE_PROMPTS = {
+    "zip_code": "Ask for their ZIP code. Validate it's a 5-digit number.",
+    "full_name": "Briefly acknowledge their ZIP code, then ask for their full name.",
+    "email": "Briefly acknowledge their name, then ask for their email address.",
+    "vehicle_choice": "Briefly acknowledge their email, then ask if they want to provide a VIN number OR enter Year, Make, and Body Type manually.",
+    "vehicle_vin": "Ask for their vehicle's VIN (17 characters).",
+    "vehicle_year": "Ask for the vehicle's year.",
+    "vehicle_make": "Acknowledge the year, then ask for the vehicle's make (e.g., Toyota, Ford, Honda).",
+    "vehicle_body": "Acknowledge the make, then ask for the vehicle's body type (e.g., Sedan, SUV, Truck, Coupe).",
+    "vehicle_use": "Acknowledge the vehicle details, then ask how they use this vehicle. Options: Commuting, Commercial, Farming, or Business.",
+    "blind_spot_warning": "Acknowledge the vehicle use, then ask if the vehicle has blind spot warning equipment (Yes/No).",
+    "commute_days": "Acknowledge their response, then ask how many days per week they use this vehicle for commuting.",
+    "commute_miles": "Acknowledge the days, then ask about one-way miles to work/school.",
+    "annual_mileage": "Acknowledge their commute distance, then ask for their estimated ANNUAL MILEAGE for this vehicle. Do NOT ask about other vehicles or license yet - ONLY ask for annual mileage.",
+    "add_another_vehicle": "Acknowledge the information collected, then ask if they want to add another vehicle to their policy.",
+    "license_type": "IMPORTANT: The user has finished adding vehicles. Now ask about their DRIVER'S LICENSE type (NOT about vehicles). Ask: What type of US driver's license do you have? Options: Foreign, Personal, or Commercial.",
+    "license_status": "Acknowledge the license type, then ask about their license status: Valid or Suspended.",
+    "complete": "Thank them warmly and let them know their information has been collected successfully. Keep it brief and positive."
+}
+
+# Canned replies used when OpenAI can't be reached
+FALLBACK_RESPONSES = {
+    "zip_code": "Could you please provide your ZIP code?",
+    "full_name": "What is your full name?",
+    "email": "What is your email address?",
+    "vehicle_choice": "Would you like to enter a VIN or provide Year, Make, and Body Type?",
+    "vehicle_vin": "Please enter the 17-character VIN.",
+    "vehicle_year": "What year is the vehicle?",
+    "vehicle_make": "What is the make of the vehicle?",
+    "vehicle_body": "What is the body type?",
+    "vehicle_use": "How do you use this vehicle? (Commuting, Commercial, Farming, Business)",
+    "blind_spot_warning": "Does this vehicle have blind spot warning? (Yes/No)",
+    "commute_days": "How many days per week do you commute?",
+    "commute_miles": "How many miles is your one-way commute?",
+    "annual_mileage": "Thank you! Now, what is your estimated annual mileage for this vehicle?",
+    "add_another_vehicle": "Would you like to add another vehicle?",
+    "license_type": "Great! Now, what type of US driver's license do you have? (Foreign, Personal, Commercial)",
+    "license_status": "What is your license status? (Valid/Suspended)",
+    "complete": "Thank you! Your information has been collected successfully. You can now start a new session if needed."
+}
+
+DEFAULT_FALLBACK_RESPONSE = "I'm sorry, could you repeat that?"
+
+# States whose question is a fixed prompt for a format-checked value. After a
+# clean answer, their canned reply is served directly without calling OpenAI.
+_DETERMINISTIC_STATES = frozenset({
+    "zip_code", "vehicle_vin", "vehicle_year",
+    "commute_days", "commute_miles", "annual_mileage",
+})
+
+# Replies are an acknowledgement plus one question, so cap output per state
+# rather than allowing 200 tokens everywhere
+_STATE_MAX_TOKENS = {
+    "full_name": 60,
+    "email": 60,
+    "vehicle_make": 60,
+    "vehicle_body": 60,
+    "blind_spot_warning": 60,
+    "license_status": 60,
+    "vehicle_choice": 80,
+    "vehicle_use": 80,
+    "annual_mileage": 80,
+    "add_another_vehicle": 80,
+    "license_type": 80,
+    "complete": 80,
+}
+DEFAULT_MAX_TOKENS = 120
+
+FRUSTRATION_KEYWORDS = [
+    "frustrated", "angry", "annoyed", "speak to human", "talk to someone",
+    "real person", "agent", "representative", "this is ridiculous",
+    "hate this", "stupid", "useless", "waste of time", "give up",
+    "help me", "not working", "doesn't work", "broken"
+]
+
+# One pass over the message instead of a substring scan per keyword. Matched
+# case-sensitively against the lowercased message: without IGNORECASE, re
+# builds a first-character set for the alternation and skips every position
+# that can't start a keyword, which keeps long pasted messages cheap
+_FRUSTRATION_RE = re.compile("|".join(map(re.escape, FRUSTRATION_KEYWORDS)))
+
+# Per-turn instructions. Sent as a separate system message after the history
+# so that BASE_PROMPT and the history form a stable, cacheable prompt prefix.
+TASK_PROMPT_TEMPLATE = (
+    "=== YOUR CURRENT TASK (DO EXACTLY THIS) ===\n{state_instruction}\n"
+    "===========================================\n{context_str}"
+)
+
+
+@lru_cache(maxsize=512)
+def _render_task_prompt(current_state: str, context_items: Tuple[Tuple[str, Any], ...]) -> str:
+    """Render the task prompt. Pure, so retries and repeated turns reuse the string."""
+    
+    state_instruction = STATE_PROMPTS.get(current_state, "Continue the conversation naturally.")
+    
+    context_str = ""
+    if context_items:
+        context_str = "\n\nCollected information so far:\n" + "".join(
+            f"- {key}: {value}\n" for key, value in context_items if value
+        )
+    
+    return TASK_PROMPT_TEMPLATE.format_map({
+        "state_instruction": state_instruction,
+        "context_str": context_str,
+    })
+
+# Used to fold turns that drop out of the history window into a running summary
+SUMMARY_PROMPT = (
+    "Summarize this insurance intake conversation for the assistant that continues it. "
+    "Keep every fact the user provided (names, dates, addresses, vehicles, licenses) "
+    "and any open question. Be brief; plain sentences, no greetings."
+)
+
+
+# Completed replies, so repeated inputs (retries, demos, test runs) skip the
+# API call entirely. Keyed by the model, state, user message, collected
+# context and extra instructions; the conversation history (and its summary)
+# is deliberately left out, so the same answer in the same state reuses a
+# reply whatever was said earlier.
+_response_cache: LRUCache = LRUCache(maxsize=1024)
+
+
+def _response_cache_key(
+    model: str,
+    current_state: str,
+    user_message: str,
+    context: Dict,
+    additional_context: Optional[str]
+) -> bytes:
+    raw = b"|".join((
+        model.encode(),
+        current_state.encode(),
+        user_message.encode(),
+        orjson.dumps(context, option=orjson.OPT_SORT_KEYS, default=str),
+        (additional_context or "").encode(),
+    ))
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+# One client per process: every OpenAIService shares its keep-alive pool, and
+# HTTP/2 lets concurrent completions multiplex over a single connection
+_OPENAI = AsyncOpenAI(
+    api_key=_API_KEY,
+    http_client=DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+    ),
+)
+
+
+class OpenAIService:
+    """Service for generating conversational responses using OpenAI."""
+    
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.client = _OPENAI
+        self.model = model
+    
+    @staticmethod
+    async def aclose() -> None:
+        """Close the shared OpenAI client. Called on application shutdown."""
+        await _OPENAI.close()
+    
+    def _get_task_prompt(self, current_state: str, context: Dict) -> str:
+        """Generate the per-turn task prompt based on current conversation state."""
+        # Sorted so the same facts always render to the same bytes (and hit the
+        # same cache entry), whatever order the caller filled the dict in
+        return _render_task_prompt(current_state, tuple(sorted(context.items())))
+    
+    def _build_messages(
+        self,
+        current_state: str,
+        user_message: str,
+        conversation_history: Sequence[Dict[str, str]],
+        context: Dict,
+        additional_context: Optional[str] = None,
+        history_summary: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Assemble the chat messages for a completion request.
+        
+        conversation_history is the already-windowed history (a list, or a
+        deque(maxlen=...) kept by the caller); it is passed through unsliced.
+        """
+        
+        task_prompt = self._get_task_prompt(current_state, context)
+        
+        if additional_context:
+            task_prompt += f"\n\nAdditional context: {additional_context}"
+        
+        # Turns older than the window survive only as a running summary
+        summary_messages = (
+            [{"role": "system", "content": f"Prior conversation summary: {history_summary}"}]
+            if history_summary else []
+        )
+        
+        # Stable parts first (rules, summary, history) so consecutive requests
+        # share a cacheable prefix; per-turn instructions and the user go last
+        return [
+            _BASE_SYSTEM_MESSAGE,
+            *summary_messages,
+            *conversation_history,
+            {"role": "system", "content": task_prompt},
+            {"role": "user", "content": user_message},
+        ]
+    
+    async def stream_response(
+        self,
+        current_state: str,
+        user_message: str,
+        conversation_history: Sequence[Dict[str, str]],
+        context: Dict,
+        additional_context: Optional[str] = None,
+        history_summary: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the response text from OpenAI as it is generated, so callers can
+        forward it before the completion finishes. Errors are raised to the caller.
+        """
+        messages = self._build_messages(
+            current_state, user_message, conversation_history, context,
+            additional_context, history_summary
+        )
+        
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=_STATE_MAX_TOKENS.get(current_state, DEFAULT_MAX_TOKENS),
+            # Fixed-question states only reach the model to explain a rejected
+            # input; keep those replies close to deterministic
+            temperature=0.3 if current_state in _DETERMINISTIC_STATES else 0.7,
+            stream=True
+        )
         
-        state_prompts = {
-            "zip_code": "Ask for their ZIP code. Validate it's a 5-digit number.",
-            "full_name": "Briefly acknowledge their ZIP code, then ask for their full name.",
-            "email": "Briefly acknowledge their name, then ask for their email address.",
-            "vehicle_choice": "Briefly acknowledge their email, then ask if they want to provide a VIN number OR enter Year, Make, and Body Type manually.",
-            "vehicle_vin": "Ask for their vehicle's VIN (17 characters).",
-            "vehicle_year": "Ask for the vehicle's year.",
-            "vehicle_make": "Acknowledge the year, then ask for the vehicle's make (e.g., Toyota, Ford, Honda).",
-            "vehicle_body": "Acknowledge the make, then ask for the vehicle's body type (e.g., Sedan, SUV, Truck, Coupe).",
-            "vehicle_use": "Acknowledge the vehicle details, then ask how they use this vehicle. Options: Commuting, Commercial, Farming, or Business.",
-            "blind_spot_warning": "Acknowledge the vehicle use, then ask if the vehicle has blind spot warning equipment (Yes/No).",
-            "commute_days": "Acknowledge their response, then ask how many days per week they use this vehicle for commuting.",
-            "commute_miles": "Acknowledge the days, then ask about one-way miles to work/school.",
-            "annual_mileage": "Acknowledge their commute distance, then ask for their estimated ANNUAL MILEAGE for this vehicle. Do NOT ask about other vehicles or license yet - ONLY ask for annual mileage.",
-            "add_another_vehicle": "Acknowledge the information collected, then ask if they want to add another vehicle to their policy.",
-            "license_type": "IMPORTANT: The user has finished adding vehicles. Now ask about their DRIVER'S LICENSE type (NOT about vehicles). Ask: What type of US driver's license do you have? Options: Foreign, Personal, or Commercial.",
-            "license_status": "Acknowledge the license type, then ask about their license status: Valid or Suspended.",
-            "complete": "Thank them warmly and let them know their information has been collected successfully. Keep it brief and positive."
-        }
-        
-        state_instruction = state_prompts.get(current_state, "Continue the conversation naturally.")
-        
-        context_str = ""
-        if context:
-            context_str = f"\n\nCollected information so far:\n"
-            for key, value in context.items():
-                if value:
-                    context_str += f"- {key}: {value}\n"
-        
-        return f"{base_prompt}\n\n=== YOUR CURRENT TASK (DO EXACTLY THIS) ===\n{state_instruction}\n===========================================\n{context_str}"
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     
     async def generate_response(
         self,
         current_state: str,
         user_message: str,
-        conversation_history: List[Dict[str, str]],
+        conversation_history: Sequence[Dict[str, str]],
         context: Dict,
-        additional_context: Optional[str] = None
+        additional_context: Optional[str] = None,
+        load_history_summary: Optional[Callable[[], Awaitable[Optional[str]]]] = None
     ) -> str:
-        """Generate a response using OpenAI."""
+        """
+        Generate a complete response using OpenAI (collects stream_response).
         
-        system_prompt = self._get_system_prompt(current_state, context)
+        load_history_summary fetches the summary of turns older than the history
+        window. It is only awaited once a model call is certain, so canned
+        replies and cache hits never pay for summarizing.
+        """
         
-        if additional_context:
-            system_prompt += f"\n\nAdditional context: {additional_context}"
+        # Nothing to judge or explain: just ask the next fixed question
+        if current_state in _DETERMINISTIC_STATES and not additional_context:
+            return FALLBACK_RESPONSES[current_state]
         
-        messages = [{"role": "system", "content": system_prompt}]
+        cache_key = _response_cache_key(
+            self.model, current_state, user_message, context, additional_context
+        )
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Add recent conversation history (last 10 messages for context)
-        for msg in conversation_history[-10:]:
-            messages.append({"role": msg["role"], "content": msg["content"]})
+        history_summary = await load_history_summary() if load_history_summary else None
         
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
+        try:
+            parts = [
+                part async for part in self.stream_response(
+                    current_state, user_message, conversation_history, context,
+                    additional_context, history_summary
+                )
+            ]
+            # Chunks pass through untouched; trim once here, and only the end,
+            # which is where the model's stray whitespace/newlines show up
+            content = "".join(parts)
+            response = content.rstrip() if content else ""
+            
+        except Exception as e:
+            # Fallback response if OpenAI fails; not cached so the next try hits the API
+            return FALLBACK_RESPONSES.get(current_state, DEFAULT_FALLBACK_RESPONSE)
+        
+        if not response:
+            # No content streamed (e.g. a content-filter finish); never save an empty reply
+            return FALLBACK_RESPONSES.get(current_state, DEFAULT_FALLBACK_RESPONSE)
+        
+        _response_cache[cache_key] = response
+        return response
+    
+    async def summarize_history(
+        self,
+        previous_summary: Optional[str],
+        messages: List[Dict[str, str]]
+    ) -> Optional[str]:
+        """
+        Extend previous_summary with messages that have left the history window.
+        Returns None if OpenAI fails so the caller can retry on a later turn.
+        """
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if previous_summary:
+            transcript = f"Summary so far: {previous_summary}\n\n{transcript}"
         
         try:
             response = await self.client.chat.completions.create(
                 model=self.model,
-                messages=messages,
-                max_tokens=200,
-                temperature=0.7
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript},
+                ],
+                max_tokens=150,
+                temperature=0
             )
+            content = response.choices[0].message.content
+            return content.strip() if content else None
             
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            # Fallback response if OpenAI fails
-            fallback_responses = {
-                "zip_code": "Could you please provide your ZIP code?",
-                "full_name": "What is your full name?",
-                "email": "What is your email address?",
-                "vehicle_choice": "Would you like to enter a VIN or provide Year, Make, and Body Type?",
-                "vehicle_vin": "Please enter the 17-character VIN.",
-                "vehicle_year": "What year is the vehicle?",
-                "vehicle_make": "What is the make of the vehicle?",
-                "vehicle_body": "What is the body type?",
-                "vehicle_use": "How do you use this vehicle? (Commuting, Commercial, Farming, Business)",
-                "blind_spot_warning": "Does this vehicle have blind spot warning? (Yes/No)",
-                "commute_days": "How many days per week do you commute?",
-                "commute_miles": "How many miles is your one-way commute?",
-                "annual_mileage": "Thank you! Now, what is your estimated annual mileage for this vehicle?",
-                "add_another_vehicle": "Would you like to add another vehicle?",
-                "license_type": "Great! Now, what type of US driver's license do you have? (Foreign, Personal, Commercial)",
-                "license_status": "What is your license status? (Valid/Suspended)",
-                "complete": "Thank you! Your information has been collected successfully. You can now start a new session if needed."
-            }
-            return fallback_responses.get(current_state, "I'm sorry, could you repeat that?")
+        except Exception:
+            return None
     
-    async def check_frustration(self, message: str) -> bool:
-        """Check if user message indicates frustration."""
-        frustration_keywords = [
-            "frustrated", "angry", "annoyed", "speak to human", "talk to someone",
-            "real person", "agent", "representative", "this is ridiculous",
-            "hate this", "stupid", "useless", "waste of time", "give up",
-            "help me", "not working", "doesn't work", "broken"
-        ]
+    async def generate_responses_batch(
+        self,
+        requests: List[Dict[str, Any]],
+        concurrency: int = 8
+    ) -> List[str]:
+        """
+        Generate responses for several independent conversations concurrently
+        (evals, regression runs, fan-out). Each request holds the keyword
+        arguments for generate_response; results come back in the same order.
+        At most `concurrency` completions are in flight at once so a large
+        batch doesn't trip OpenAI rate limits.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
         
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in frustration_keywords)
-
+        async def run(request: Dict[str, Any]) -> str:
+            async with semaphore:
+                return await self.generate_response(**request)
+        
+        results = await asyncio.gather(*(run(r) for r in requests), return_exceptions=True)
+        
+        return [
+            FALLBACK_RESPONSES.get(request.get("current_state"), DEFAULT_FALLBACK_RESPONSE)
+            if isinstance(result, BaseException) else result
+            for request, result in zip(requests, results)
+        ]
+    
+    def check_frustration(self, message: str) -> bool:
+        """Check if user message indicates frustration."""
+        return _FRUSTRATION_RE.search(message.lower()) is not None